@@ -121,6 +121,16 @@ DATABASES = {"default": env.db()}
 if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
     logger.warning("Running application with SQLite backend. Data may be lost.")
 
+# Cached data must be shared by all the web workers and management commands, so that
+# invalidations are seen by every process. A local memory cache is only used in development.
+# https://django-environ.readthedocs.io/en/latest/types.html#environ-env-cache-url
+CACHES = {
+    "default": env.cache(
+        "CACHE_URL",
+        default="locmemcache://" if DEBUG else "dbcache://code_review_cache",
+    )
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -6,21 +6,32 @@ from collections import defaultdict
 from datetime import date, datetime, timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import BadRequest
-from django.db.models import BooleanField, Count, ExpressionWrapper, Prefetch, Q
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    OuterRef,
+    Prefetch,
+    Q,
+    Sum,
+)
 from django.db.models.functions import TruncDate
 from django.shortcuts import get_object_or_404
 from django.urls import path
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import generics, mixins, routers, status, viewsets
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 
+from code_review_backend.issues import cache as checks_cache
 from code_review_backend.issues.models import (
     LEVEL_ERROR,
     Diff,
     Issue,
+    IssueCheckStat,
     IssueLink,
     Repository,
     Revision,
@@ -38,13 +49,58 @@ from code_review_backend.issues.serializers import (
     RevisionSerializer,
 )
 
+# Revision columns exposed by the serializers of diffs, with their repositories URL
+REVISION_FIELDS = (
+    "revision__id",
+    "revision__provider",
+    "revision__provider_id",
+    "revision__title",
+    "revision__bugzilla_id",
+    "revision__base_changeset",
+    "revision__head_changeset",
+    "revision__base_repository__url",
+    "revision__head_repository__url",
+)
+
+
+def get_repository_id(slug):
+    """
+    Resolve a repository slug to its ID, so that querysets can filter on
+    foreign keys directly instead of joining on the repositories table
+    """
+    return Repository.objects.filter(slug=slug).values_list("id", flat=True).first()
+
 
 class CachedView:
-    """Helper to bring DRF caching to GET methods"""
+    """
+    Helper to cache the rows of DRF list views until issues are updated.
+    Rows are cached before pagination, so that all the pages share the same entry.
+    """
+
+    # Query parameters changing the rows, used to build the cache key
+    cache_params = ()
+
+    def list(self, request, *args, **kwargs):
+        key = checks_cache.build_key(
+            self.__class__.__name__,
+            {
+                name: request.query_params[name]
+                for name in self.cache_params
+                if name in request.query_params
+            },
+        )
+        rows = cache.get(key)
+        if rows is None:
+            rows = list(self.filter_queryset(self.get_queryset()))
+            cache.set(key, rows, checks_cache.CACHE_TIMEOUT)
 
-    @method_decorator(cache_page(1800))
-    def get(self, *args, **kwargs):
-        return super().get(*args, **kwargs)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(rows, many=True)
+        return Response(serializer.data)
 
 
 class CreateListRetrieveViewSet(
@@ -72,6 +128,14 @@ class RevisionViewSet(CreateListRetrieveViewSet):
     queryset = Revision.objects.all()
     serializer_class = RevisionSerializer
 
+    def get_existing_revision(self, provider, provider_id):
+        if provider_id is None:
+            return None
+        return Revision.objects.filter(
+            provider=provider,
+            provider_id=provider_id,
+        ).first()
+
     def create(self, request, *args, **kwargs):
         """Override CreateModelMixin.create to avoid creating duplicates"""
 
@@ -83,17 +147,21 @@ class RevisionViewSet(CreateListRetrieveViewSet):
             provider_id = request.data["provider_id"]
         except KeyError:
             raise BadRequest("Invalid provider identification")
-        if provider_id is not None:
-            if revision := Revision.objects.filter(
-                provider=provider,
-                provider_id=provider_id,
-            ).first():
-                serializer = RevisionSerializer(
-                    instance=revision, context={"request": request}
-                )
-                return Response(serializer.data, status=status.HTTP_200_OK)
 
-        return super().create(request, *args, **kwargs)
+        revision = self.get_existing_revision(provider, provider_id)
+        if revision is None:
+            try:
+                with transaction.atomic():
+                    return super().create(request, *args, **kwargs)
+            except IntegrityError:
+                # The unique constraint on the provider ID failed as the same revision
+                # has been created concurrently, so we return that revision instead
+                revision = self.get_existing_revision(provider, provider_id)
+                if revision is None:
+                    raise
+
+        serializer = RevisionSerializer(instance=revision, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class RevisionDiffViewSet(CreateListRetrieveViewSet):
@@ -127,16 +195,26 @@ class DiffViewSet(viewsets.ReadOnlyModelViewSet):
             Diff.objects
             # Because of the perf. hit filter issues that are not older than today - 3 months.
             .filter(created__gte=date.today() - timedelta(days=90))
-            .prefetch_related(
-                Prefetch(
-                    "issue_links",
-                    queryset=IssueLink.objects.select_related("issue"),
-                ),
-                "revision",
+            # Forward relations are fetched in the same SQL query as the diffs page,
+            # issues are only used through the aggregated counters below.
+            .select_related(
                 "revision__base_repository",
                 "revision__head_repository",
                 "repository",
             )
+            # Only load the columns exposed by the serializer
+            .only(
+                "id",
+                "provider_id",
+                "created",
+                "review_task_id",
+                "mercurial_hash",
+                "repository__id",
+                "repository__slug",
+                "repository__url",
+                *REVISION_FIELDS,
+            )
+            # All counters are computed in a single pass over the issue links of each diff
             .annotate(nb_issues=Count("issue_links"))
             .annotate(
                 nb_errors=Count(
@@ -158,24 +236,30 @@ class DiffViewSet(viewsets.ReadOnlyModelViewSet):
             .order_by("-id")
         )
 
-        # Filter by repository
+        # Filter by repository, resolving its ID once to avoid joining on repositories
         repository = self.request.query_params.get("repository")
         if repository is not None:
+            repo_id = get_repository_id(repository)
+            if repo_id is None:
+                return Diff.objects.none()
             diffs = diffs.filter(
-                Q(revision__base_repository__slug=repository)
-                | Q(revision__head_repository__slug=repository)
-                | Q(repository__slug=repository)
+                Q(revision__base_repository_id=repo_id)
+                | Q(revision__head_repository_id=repo_id)
+                | Q(repository_id=repo_id)
             )
 
         # Filter by text search query
+        # With PostgreSQL, the search in titles is backed by a trigram index
         query = self.request.query_params.get("search")
         if query is not None:
-            search_query = (
-                Q(id__icontains=query)
-                | Q(revision__provider_id__icontains=query)
-                | Q(revision__bugzilla_id__icontains=query)
-                | Q(revision__title__icontains=query)
-            )
+            search_query = Q(revision__title__icontains=query)
+            if query.isdecimal():
+                # Numeric identifiers are matched exactly, so their indexes can be used
+                search_query |= (
+                    Q(id=int(query))
+                    | Q(revision__provider_id=int(query))
+                    | Q(revision__bugzilla_id=int(query))
+                )
             diffs = diffs.filter(search_query)
 
         # Filter by issues types
@@ -255,34 +339,19 @@ class IssueCheckDetails(generics.ListAPIView):
     serializer_class = IssueCheckSerializer
 
     def get_queryset(self):
-        repo = self.kwargs["repository"]
-
-        queryset = (
-            Issue.objects.filter(issue_links__revision__head_repository__slug=repo)
-            .filter(analyzer=self.kwargs["analyzer"])
-            .filter(analyzer_check=self.kwargs["check"])
-            .annotate(publishable=Q(issue_links__in_patch=True) & Q(level=LEVEL_ERROR))
-            .prefetch_related(
-                "issue_links__diff__repository",
-                Prefetch(
-                    "issue_links__diff__revision",
-                    queryset=Revision.objects.select_related(
-                        "base_repository", "head_repository"
-                    ),
-                ),
-            )
-            # List of diffs for each link of this issue
-            .prefetch_related("diffs")
-            .order_by("-created")
+        filters = Q(analyzer=self.kwargs["analyzer"]) & Q(
+            analyzer_check=self.kwargs["check"]
         )
 
         # Display only publishable issues by default
         publishable = self.request.query_params.get("publishable", "true").lower()
-        _filter = Q(issue_links__in_patch=True) | Q(level=LEVEL_ERROR)
+        _filter = Q(
+            Exists(IssueLink.objects.filter(issue=OuterRef("pk"), in_patch=True))
+        ) | Q(level=LEVEL_ERROR)
         if publishable == "true":
-            queryset = queryset.filter(_filter)
+            filters &= _filter
         elif publishable == "false":
-            queryset = queryset.exclude(_filter)
+            filters &= ~_filter
         elif publishable != "all":
             raise APIException(detail="publishable can only be true, false or all")
 
@@ -293,9 +362,45 @@ class IssueCheckDetails(generics.ListAPIView):
                 since = datetime.strptime(since, "%Y-%m-%d").date()
             except ValueError:
                 raise APIException(detail="invalid since date - should be YYYY-MM-DD")
-            queryset = queryset.filter(created__gte=since)
+            filters &= Q(created__gte=since)
+
+        # Resolve the repository once to filter issues without joining on its slug
+        repo_id = get_repository_id(self.kwargs["repository"])
+        if repo_id is None:
+            return Issue.objects.none()
+
+        # Use subqueries on the issue links so that each issue is only listed once
+        repo_links = IssueLink.objects.filter(
+            issue=OuterRef("pk"), revision__head_repository_id=repo_id
+        )
+        queryset = (
+            Issue.objects.filter(Exists(repo_links))
+            .filter(filters)
+            .annotate(
+                publishable=Q(
+                    Exists(repo_links.filter(in_patch=True)), level=LEVEL_ERROR
+                )
+            )
+            .only(
+                "id", "hash", "analyzer", "analyzer_check", "path", "level", "message"
+            )
+            # List of diffs for each link of this issue, in that repository
+            .prefetch_related(
+                Prefetch(
+                    "diffs",
+                    queryset=Diff.objects.filter(revision__head_repository_id=repo_id)
+                    .select_related(
+                        "repository",
+                        "revision__base_repository",
+                        "revision__head_repository",
+                    )
+                    .only("id", "provider_id", "repository__url", *REVISION_FIELDS),
+                )
+            )
+            .order_by("-created")
+        )
 
-        return queryset.distinct()
+        return queryset
 
 
 class IssueCheckStats(CachedView, generics.ListAPIView):
@@ -305,33 +410,9 @@ class IssueCheckStats(CachedView, generics.ListAPIView):
     """
 
     serializer_class = IssueCheckStatsSerializer
+    cache_params = ("since",)
 
     def get_queryset(self):
-        queryset = (
-            Issue.objects.values(
-                "issue_links__revision__head_repository__slug",
-                "analyzer",
-                "analyzer_check",
-            )
-            # We want to count distinct issues because they can be referenced on multiple diffs
-            .annotate(total=Count("id", distinct=True))
-            .annotate(
-                has_check=ExpressionWrapper(
-                    Q(analyzer_check__isnull=True), output_field=BooleanField()
-                )
-            )
-            .annotate(
-                publishable=Count(
-                    "id", filter=Q(issue_links__in_patch=True) | Q(level=LEVEL_ERROR)
-                )
-            )
-            .distinct(
-                "issue_links__revision__head_repository__slug",
-                "analyzer",
-                "analyzer_check",
-            )
-        )
-
         # Filter issues by date
         since = self.request.query_params.get("since")
         if since is not None:
@@ -343,23 +424,24 @@ class IssueCheckStats(CachedView, generics.ListAPIView):
             # Because of the perf. hit filter, issues that are not older than today - 3 months.
             since = date.today() - timedelta(days=90)
 
-        queryset = queryset.filter(issue_links__revision__created__gte=since).distinct()
-
-        return queryset.order_by(
-            "-total",
-            "issue_links__revision__head_repository__slug",
-            "analyzer",
-            # Use same order than PostgreSQL with SQLite
-            "has_check",
-            "analyzer_check",
-        ).values(
-            "issue_links__revision__head_repository__slug",
-            "analyzer",
-            "analyzer_check",
-            "total",
-            "publishable",
-            "issue_links__in_patch",
-            "issue_links__new_for_revision",
+        # Sum the daily statistics that are pre-aggregated in database
+        return (
+            IssueCheckStat.objects.filter(day__gte=since)
+            .values("repository_slug", "analyzer", "analyzer_check")
+            .annotate(total=Sum("nb_issues"), publishable=Sum("nb_publishable"))
+            .annotate(
+                has_check=ExpressionWrapper(
+                    Q(analyzer_check__isnull=True), output_field=BooleanField()
+                )
+            )
+            .order_by(
+                "-total",
+                "repository_slug",
+                "analyzer",
+                # Use same order than PostgreSQL with SQLite
+                "has_check",
+                "analyzer_check",
+            )
         )
 
 
@@ -373,6 +455,7 @@ class IssueCheckHistory(CachedView, generics.ListAPIView):
     """
 
     serializer_class = HistoryPointSerializer
+    cache_params = ("repository", "analyzer", "check", "since")
 
     # For ease of use, the history is available without pagination
     # as the SQL request should be always fast to calculate
@@ -386,12 +469,20 @@ class IssueCheckHistory(CachedView, generics.ListAPIView):
             .annotate(total=Count("id"))
         )
 
-        # Filter by repository
+        # Filter by repository, using a subquery so that issues found
+        # on multiple diffs are not counted several times
         repository = self.request.query_params.get("repository")
         if repository:
+            repo_id = get_repository_id(repository)
+            if repo_id is None:
+                return Issue.objects.none()
             queryset = queryset.filter(
-                Q(diffs__revision__base_repository__slug=repository)
-                | Q(diffs__revision__head_repository__slug=repository)
+                Exists(
+                    IssueLink.objects.filter(issue=OuterRef("pk")).filter(
+                        Q(diff__revision__base_repository_id=repo_id)
+                        | Q(diff__revision__head_repository_id=repo_id)
+                    )
+                )
             )
 
         # Filter by analyzer
@@ -425,49 +516,21 @@ class IssueCheckHistory(CachedView, generics.ListAPIView):
             else:
                 queryset = queryset.filter(date__gte=since.date())
 
-        return queryset.order_by("date").distinct()
+        return queryset.order_by("date")
 
 
 class IssueList(generics.ListAPIView):
     serializer_class = IssueHashSerializer
 
     def get_queryset(self):
-        qs = Issue.objects.all().only("id", "hash").prefetch_related("revisions")
-
         errors = defaultdict(list)
-        repo_slug = self.kwargs["repo_slug"]
-        filters = {}
-        try:
-            repo = Repository.objects.get(slug=repo_slug)
-        except Repository.DoesNotExist:
-            repo = None
-            errors["repo_slug"].append(
-                "invalid repo_slug path argument - No repository match this slug"
-            )
-        else:
-            filters["revisions__head_repository"] = repo
-
-        # Always filter by path when the parameter is set
-        if path := self.request.query_params.get("path"):
-            filters["path"] = path
 
-        date_revision = None
+        # Validate the query parameters before running any SQL request
         if date := self.request.query_params.get("date"):
             try:
                 date = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)
             except ValueError:
                 errors["date"].append("invalid date - should be YYYY-MM-DD")
-            else:
-                # Look for a revision matching this date, going back to 2 days maximum
-                date_revision = (
-                    Revision.objects.filter(
-                        head_repository=repo,
-                        created__gte=date - timedelta(2),
-                        created__lt=date,
-                    )
-                    .order_by("created")
-                    .last()
-                )
 
         rev_changeset = self.request.query_params.get("revision_changeset")
         if rev_changeset is not None and len(rev_changeset) != 40:
@@ -475,22 +538,63 @@ class IssueList(generics.ListAPIView):
                 "invalid revision_changeset - should be the mercurial hash on the head repository"
             )
 
+        # The repository is always resolved, so that all errors are reported at once
+        repo_id = get_repository_id(self.kwargs["repo_slug"])
+        if repo_id is None:
+            errors["repo_slug"].append(
+                "invalid repo_slug path argument - No repository match this slug"
+            )
+
         if errors:
             raise ValidationError(errors)
 
-        # Only use the revision filter in case some issues are found
-        if (
-            rev_changeset
-            and qs.filter(revisions__head_changeset=rev_changeset).exists()
-        ):
-            filters["revisions__head_changeset"] = rev_changeset
-        elif rev_changeset and not date_revision:
-            qs = Issue.objects.none()
+        qs = Issue.objects.all().only("id", "hash").prefetch_related("revisions")
+
+        # Always filter by path when the parameter is set
+        if path := self.request.query_params.get("path"):
+            qs = qs.filter(path=path)
+
+        # Filters applied on the revisions of the issues, through their links
+        filters = {"revision__head_repository_id": repo_id}
+
+        date_revision = None
+        if date:
+            # Look for a revision matching this date, going back to 2 days maximum
+            date_revision = (
+                Revision.objects.filter(
+                    head_repository_id=repo_id,
+                    created__gte=date - timedelta(2),
+                    created__lt=date,
+                )
+                .order_by("created")
+                .last()
+            )
+
+        revision_filter = Q()
+        if rev_changeset and date_revision:
+            # Only use the revision filter in case some issues are found, otherwise
+            # fall back to the revision closest to the given date. The check is
+            # performed by a subquery, in the same SQL request as the listing.
+            revision_filter = Q(revision__head_changeset=rev_changeset) | (
+                Q(revision=date_revision)
+                & ~Exists(
+                    IssueLink.objects.filter(revision__head_changeset=rev_changeset)
+                )
+            )
+        elif rev_changeset:
+            filters["revision__head_changeset"] = rev_changeset
         # Defaults to filtering by the revision closest to the given date
         elif date_revision:
-            filters["revisions"] = date_revision
+            filters["revision"] = date_revision
 
-        return qs.filter(**filters).order_by("created").distinct()
+        # Use a subquery on the issue links so that each issue is only listed once
+        return qs.filter(
+            Exists(
+                IssueLink.objects.filter(
+                    revision_filter, issue=OuterRef("pk"), **filters
+                )
+            )
+        ).order_by("created")
 
 
 # Build exposed urls for the API
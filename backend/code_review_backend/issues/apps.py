@@ -3,7 +3,18 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class IssuesConfig(AppConfig):
     name = "code_review_backend.issues"
+
+    def ready(self):
+        from code_review_backend.issues import cache
+        from code_review_backend.issues.models import Issue, IssueLink
+
+        # Invalidate cached checks data when issues are updated.
+        # Bulk operations do not send signals and must invalidate it explicitly.
+        for model in (Issue, IssueLink):
+            post_save.connect(cache.invalidate, sender=model)
+            post_delete.connect(cache.invalidate, sender=model)
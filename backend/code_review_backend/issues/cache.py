@@ -0,0 +1,31 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Cached checks data is kept for an hour unless issues are updated
+CACHE_TIMEOUT = 3600
+
+# All the cache keys embed a version, so that all of them can be invalidated at
+# once without relying on a backend specific feature to delete keys by pattern.
+# The version is bumped by web workers and management commands, so the cache backend
+# must be shared among processes (see CACHES in settings).
+VERSION_KEY = "checks:version"
+
+
+def build_key(prefix: str, params: dict) -> str:
+    """Build a cache key from a prefix and normalized query parameters"""
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+    return f"checks:{version}:{prefix}:{urlencode(sorted(params.items()))}"
+
+
+def invalidate(**kwargs):
+    """
+    Invalidate all the cached checks data once the current transaction is committed.
+    Usable as a signal receiver.
+    """
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time_ns(), timeout=None))
@@ -10,6 +10,7 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from code_review_backend.issues import cache as checks_cache
 from code_review_backend.issues.models import (
     Diff,
     Issue,
@@ -103,5 +104,8 @@ class Command(BaseCommand):
         rev_count = rev_to_delete._raw_delete(rev_to_delete.db)
         stats["Revision"] += rev_count
 
+        # Raw deletions do not send signals to invalidate cached checks data
+        checks_cache.invalidate()
+
         msg = ", ".join((f"{n} {key}" for key, n in stats.items()))
         logger.info(f"Deleted {msg}.")
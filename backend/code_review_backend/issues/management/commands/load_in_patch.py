@@ -3,12 +3,15 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import logging
-from multiprocessing import Pool
+from bisect import bisect_left
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
-from django import db
+import rs_parsepatch
 from django.core.management.base import BaseCommand
-from parsepatch.patch import Patch
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from requests.adapters import HTTPAdapter
 
 from code_review_backend.app.settings import BACKEND_USER_AGENT
 from code_review_backend.issues.models import Diff, IssueLink
@@ -17,12 +20,15 @@ logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+UPDATE_BATCH_SIZE = 1000
+DIFFS_CHUNK_SIZE = 500
 
-def load_hgmo_patch(diff):
+
+def load_hgmo_patch(diff, session):
     # Load the parent info as we have the try-task-config commit
     url = f"{diff.repository.url}/json-rev/{diff.mercurial_hash}"
     logging.info(f"Downloading {url}")
-    resp = requests.get(url, headers={"user-agent": BACKEND_USER_AGENT})
+    resp = session.get(url)
     resp.raise_for_status()
     meta = resp.json()
     if meta["desc"].startswith("try_task_config"):
@@ -33,82 +39,136 @@ def load_hgmo_patch(diff):
     # Load the parent patch
     url = f"{diff.repository.url}/raw-rev/{patch_rev}"
     logging.info(f"Downloading {url}")
-    resp = requests.get(url, headers={"user-agent": BACKEND_USER_AGENT})
+    resp = session.get(url)
     resp.raise_for_status()
 
-    patch = Patch.parse_patch(resp.text, skip_comments=False)
-    assert patch != {}, "Empty patch"
+    # Parse the patch with the same compiled parser as the code-review bot
+    patch_stats = rs_parsepatch.get_lines(resp.text)
+    assert len(patch_stats) > 0, "Empty patch"
     lines = {
-        # Use all changes in new files
-        filename: diff.get("touched", []) + diff.get("added", [])
-        for filename, diff in patch.items()
+        # Use all changes in new files, sorted to allow binary searches in detect_in_patch
+        stat["filename"]: sorted(set(stat["added_lines"]))
+        for stat in patch_stats
     }
 
     return lines
 
 
 def detect_in_patch(issue_link, lines):
-    """From the code-review bot revisions.py contains() method"""
+    """
+    From the code-review bot revisions.py contains() method.
+    Modified lines for each file must be sorted.
+    """
     modified_lines = lines.get(issue_link.issue.path)
 
     if modified_lines is None:
         # File not in patch
         issue_link.in_patch = False
 
-    elif issue_link.issue.line is None:
+    elif issue_link.line is None:
         # Empty line means full file
         issue_link.in_patch = True
 
     else:
-        # Detect if this issue is in the patch
-        chunk_lines = set(
-            range(
-                issue_link.issue.line, issue_link.issue.line + issue_link.issue.nb_lines
-            )
+        # Detect if this issue is in the patch, by looking up
+        # the first modified line after the start of the issue
+        nb_lines = 1 if issue_link.nb_lines is None else issue_link.nb_lines
+        index = bisect_left(modified_lines, issue_link.line)
+        issue_link.in_patch = (
+            index < len(modified_lines)
+            and modified_lines[index] < issue_link.line + nb_lines
         )
-        issue_link.in_patch = not chunk_lines.isdisjoint(modified_lines)
     return issue_link
 
 
-def process_diff(diff: Diff):
-    """This function needs to be on the top level in order to be usable by the pool"""
+def process_diff(diff: Diff, issue_links: list, session: requests.Session):
+    """
+    Detect issues in patch for a diff, using a HTTP session shared among threads.
+    Issue links are loaded by the caller, so that threads never use the database.
+    Returns the updated issue links, that must be saved by the caller.
+    """
     try:
-        lines = load_hgmo_patch(diff)
+        lines = load_hgmo_patch(diff, session)
 
-        issue_links = [
-            detect_in_patch(issue_link, lines) for issue_link in diff.issue_links.all()
-        ]
+        in_patch_count = 0
+        for issue_link in issue_links:
+            detect_in_patch(issue_link, lines)
+            in_patch_count += issue_link.in_patch
         logging.info(
-            f"Found {len([i for i in issue_links if i.in_patch])} issue link in patch for {diff.provider_id}"
+            f"Found {in_patch_count} issue link in patch for {diff.provider_id}"
         )
-        IssueLink.objects.bulk_update(issue_links, ["in_patch"])
+        return issue_links
     except Exception as e:
         logging.info(f"Failure on diff {diff.provider_id}: {e}")
+        return []
+
+
+def save_issue_links(issue_links):
+    """Save the in_patch attribute of issue links in a single transaction"""
+    with transaction.atomic():
+        IssueLink.objects.bulk_update(
+            issue_links, ["in_patch"], batch_size=UPDATE_BATCH_SIZE
+        )
 
 
 class Command(BaseCommand):
-    help = "Load issues from remote taskcluster reports"
+    # The code-review bot sends in_patch along with each issue it publishes, so only
+    # historical issue links still need to be updated by this command
+    help = "Backfill the in_patch attribute of historical issue links"
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "--nb-processes",
+            "--nb-threads",
             type=int,
-            help="Number of processes used to process the diffs",
-            default=1,
+            help="Number of threads used to download and process the diffs",
+            default=8,
         )
 
+    def store_results(self, futures):
+        """Gather issue links from processed diffs and save them by batches"""
+        for future in futures:
+            self.to_update.extend(future.result())
+        if len(self.to_update) >= UPDATE_BATCH_SIZE:
+            save_issue_links(self.to_update)
+            self.to_update = []
+
     def handle(self, *args, **options):
         # Only apply on diffs with issues that are not already processed
         diffs = (
-            Diff.objects.filter(issue_links__in_patch__isnull=True)
+            Diff.objects.filter(
+                Exists(
+                    IssueLink.objects.filter(diff=OuterRef("pk"), in_patch__isnull=True)
+                )
+            )
+            .select_related("repository")
             .order_by("id")
-            .distinct()
         )
-        logger.debug(f"Will process {diffs.count()} diffs")
-
-        # Close all DB connection so each process get its own
-        db.connections.close_all()
-
-        # Process all the diffs in parallel
-        with Pool(processes=options["nb_processes"]) as pool:
-            pool.map(process_diff, diffs, chunksize=20)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Will process {diffs.count()} diffs")
+
+        # Share a single HTTP session among threads, keeping one alive connection per thread
+        session = requests.Session()
+        session.headers["user-agent"] = BACKEND_USER_AGENT
+        adapter = HTTPAdapter(pool_maxsize=options["nb_threads"])
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        # Process all the diffs in parallel, as the work is bound by HTTP latency
+        # Updates are gathered from all the diffs and written by batches from the main thread
+        self.to_update = []
+        with ThreadPoolExecutor(max_workers=options["nb_threads"]) as executor:
+            # Stream diffs from the database, only queuing a few of them for the threads
+            pending = set()
+            for diff in diffs.iterator(chunk_size=DIFFS_CHUNK_SIZE):
+                if len(pending) >= 2 * options["nb_threads"]:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.store_results(done)
+                # Load the issue links of the diff with their issue from the main thread
+                issue_links = list(diff.issue_links.select_related("issue"))
+                pending.add(executor.submit(process_diff, diff, issue_links, session))
+
+            done, _ = wait(pending)
+            self.store_results(done)
+
+        if self.to_update:
+            save_issue_links(self.to_update)
@@ -0,0 +1,29 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from code_review_backend.issues import cache as checks_cache
+from code_review_backend.issues.models import IssueCheckStat
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Refresh the daily statistics of issues per analyzer check"
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            logger.info("Statistics are backed by a plain view, nothing to refresh.")
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"REFRESH MATERIALIZED VIEW CONCURRENTLY {IssueCheckStat._meta.db_table}"
+            )
+        checks_cache.invalidate()
+        logger.info("Refreshed issue checks statistics.")
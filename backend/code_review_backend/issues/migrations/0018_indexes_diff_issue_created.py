@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-15 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0017_diff_auto_pk"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="diff",
+            index=models.Index(
+                fields=["created", "-id"], name="issues_diff_created_e10cf7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["created"], name="issues_issu_created_f5f46a_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+
+STATS_QUERY = """
+WITH issue_repository AS (
+    SELECT
+        repo.slug AS repository_slug,
+        issue.analyzer,
+        issue.analyzer_check,
+        MAX(rev.created) AS last_seen,
+        SUM(
+            CASE WHEN link.in_patch OR issue.level = 'error' THEN 1 ELSE 0 END
+        ) AS nb_publishable
+    FROM issues_issue AS issue
+    INNER JOIN issues_issuelink AS link ON link.issue_id = issue.id
+    INNER JOIN issues_revision AS rev ON rev.id = link.revision_id
+    INNER JOIN issues_repository AS repo ON repo.id = rev.head_repository_id
+    GROUP BY repo.slug, issue.id, issue.analyzer, issue.analyzer_check
+)
+SELECT
+    ROW_NUMBER() OVER (
+        ORDER BY repository_slug, analyzer, analyzer_check, {day}
+    ) AS id,
+    repository_slug,
+    analyzer,
+    analyzer_check,
+    {day} AS day,
+    COUNT(*) AS nb_issues,
+    CAST(SUM(nb_publishable) AS bigint) AS nb_publishable
+FROM issue_repository
+GROUP BY repository_slug, analyzer, analyzer_check, {day}
+"""
+
+
+def _create_view(apps, schema_editor):
+    """
+    Aggregating issues for all the checks is too slow to be performed on each request.
+    Each issue is counted once per repository, on the last day it has been found, so that
+    summing the days from a date gives the number of distinct issues found since then.
+    PostgreSQL stores the daily aggregation in a materialized view, with a unique index
+    so it can be refreshed concurrently without locking reads.
+    Other backends (e.g. SQLite for development) use a plain view that is always up to date.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.execute(
+            "CREATE VIEW issues_issuecheckstat AS "
+            + STATS_QUERY.format(day="DATE(last_seen)")
+        )
+        return
+
+    schema_editor.execute(
+        "CREATE MATERIALIZED VIEW issues_issuecheckstat AS "
+        + STATS_QUERY.format(day="CAST(last_seen AS date)")
+    )
+    schema_editor.execute(
+        "CREATE UNIQUE INDEX issues_issuecheckstat_unique "
+        "ON issues_issuecheckstat (repository_slug, analyzer, analyzer_check, day)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX issues_issuecheckstat_day ON issues_issuecheckstat (day)"
+    )
+
+
+def _drop_view(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.execute("DROP VIEW issues_issuecheckstat")
+    else:
+        schema_editor.execute("DROP MATERIALIZED VIEW issues_issuecheckstat")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0018_indexes_diff_issue_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IssueCheckStat",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("repository_slug", models.SlugField()),
+                ("analyzer", models.CharField(max_length=50)),
+                ("analyzer_check", models.CharField(max_length=250, null=True)),
+                ("day", models.DateField()),
+                ("nb_issues", models.PositiveIntegerField()),
+                ("nb_publishable", models.PositiveIntegerField()),
+            ],
+            options={
+                "db_table": "issues_issuecheckstat",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(_create_view, reverse_code=_drop_view),
+    ]
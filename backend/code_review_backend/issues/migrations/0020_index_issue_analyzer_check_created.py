@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-15 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0019_issue_check_stat_view"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["analyzer", "analyzer_check", "created"],
+                name="issues_issu_analyze_33929b_idx",
+            ),
+        ),
+    ]
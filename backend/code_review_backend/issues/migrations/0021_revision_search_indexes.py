@@ -0,0 +1,45 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from django.db import migrations, models
+
+
+def _create_title_trigram_index(apps, schema_editor):
+    """
+    Searching revisions by title uses a LIKE '%...%' query on the uppercased title,
+    which cannot use a btree index. A trigram GIN index on that same expression
+    allows PostgreSQL to avoid a sequential scan.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX issues_revision_title_trgm ON issues_revision "
+        "USING gin (UPPER(title::text) gin_trgm_ops)"
+    )
+
+
+def _drop_title_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX issues_revision_title_trgm")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("issues", "0020_index_issue_analyzer_check_created"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="revision",
+            index=models.Index(
+                fields=["bugzilla_id"], name="issues_revi_bugzill_0799a6_idx"
+            ),
+        ),
+        migrations.RunPython(
+            _create_title_trigram_index,
+            reverse_code=_drop_title_trigram_index,
+        ),
+    ]
@@ -82,7 +82,10 @@ class Revision(models.Model):
     class Meta:
         ordering = ("provider", "provider_id", "id")
 
-        indexes = (models.Index(fields=["head_repository", "head_changeset"]),)
+        indexes = (
+            models.Index(fields=["head_repository", "head_changeset"]),
+            models.Index(fields=["bugzilla_id"]),
+        )
         constraints = [
             models.UniqueConstraint(
                 fields=["provider_id"],
@@ -140,6 +143,10 @@ class Diff(models.Model):
 
     class Meta:
         ordering = ("created",)
+        indexes = (
+            # Diffs are listed from the most recent ones in a recent time frame
+            models.Index(fields=["created", "-id"]),
+        )
 
 
 class IssueLink(models.Model):
@@ -234,4 +241,32 @@ class Issue(models.Model):
         indexes = (
             models.Index(fields=["hash"], name="issue_hash_idx"),
             models.Index(fields=["path"]),
+            models.Index(fields=["created"]),
+            models.Index(fields=["analyzer", "analyzer_check", "created"]),
         )
+
+
+class IssueCheckStat(models.Model):
+    """
+    Daily number of issues per repository and analyzer check.
+    This model is backed by a materialized view on PostgreSQL, that is refreshed
+    periodically by the Docker entrypoint using the refresh_check_stats command.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+
+    # Head repository of the revisions where issues have been found
+    repository_slug = models.SlugField()
+    analyzer = models.CharField(max_length=50)
+    analyzer_check = models.CharField(max_length=250, null=True)
+
+    # Last day the issues have been found in the repository, from their revisions creation date
+    # Each issue is only counted on a single day, so daily values can be summed
+    day = models.DateField()
+
+    nb_issues = models.PositiveIntegerField()
+    nb_publishable = models.PositiveIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = "issues_issuecheckstat"
@@ -9,6 +9,7 @@ from django.conf import settings
 from django.db import transaction
 from rest_framework import serializers
 
+from code_review_backend.issues import cache as checks_cache
 from code_review_backend.issues.models import (
     LEVEL_ERROR,
     Diff,
@@ -18,6 +19,9 @@ from code_review_backend.issues.models import (
     Revision,
 )
 
+# Maximum number of rows inserted at once when creating issues in bulk
+BULK_CREATE_BATCH_SIZE = 500
+
 
 class RepositorySerializer(serializers.ModelSerializer):
     """
@@ -306,6 +310,7 @@ class IssueBulkSerializer(serializers.Serializer):
         # Only create issues that do not exist yet
         Issue.objects.bulk_create(
             [Issue(**values) for values in validated_data["issues"]],
+            batch_size=BULK_CREATE_BATCH_SIZE,
             ignore_conflicts=True,
         )
 
@@ -327,9 +332,13 @@ class IssueBulkSerializer(serializers.Serializer):
                 for issue_hash, links in link_attrs.items()
                 for link in links
             ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
             ignore_conflicts=True,
         )
 
+        # Bulk creation does not send signals to invalidate cached checks data
+        checks_cache.invalidate()
+
         # Endpoint expects Issue with specific attributes for re-serialization of links
         # TODO in treeherder: only expose hash & publishable in output
         output = []
@@ -370,12 +379,11 @@ class IssueCheckStatsSerializer(serializers.Serializer):
     Serialize the usage statistics for each check encountered
     """
 
-    # The view aggregates issues depending on their reference to a repository (via IssueLink M2M)
-    repository = serializers.SlugField(
-        source="issue_links__revision__head_repository__slug"
-    )
+    # The view aggregates issues depending on the head repository of their revisions
+    repository = serializers.SlugField(source="repository_slug")
     analyzer = serializers.CharField()
     check = serializers.CharField(source="analyzer_check")
+    # Number of distinct issues found in the repository during the requested period
     total = serializers.IntegerField()
     publishable = serializers.IntegerField(read_only=True, default=0)
 
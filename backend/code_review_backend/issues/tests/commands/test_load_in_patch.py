@@ -0,0 +1,214 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from code_review_backend.issues.management.commands.load_in_patch import (
+    detect_in_patch,
+    load_hgmo_patch,
+    save_issue_links,
+)
+from code_review_backend.issues.models import (
+    LEVEL_WARNING,
+    Diff,
+    Issue,
+    IssueLink,
+    Repository,
+)
+
+PATCH = """diff --git a/path/to/file.cpp b/path/to/file.cpp
+--- a/path/to/file.cpp
++++ b/path/to/file.cpp
+@@ -1,4 +1,5 @@
+ a
+-b
++B
+ c
++d
+ e
+diff --git a/path/to/new_file.py b/path/to/new_file.py
+new file mode 100644
+--- /dev/null
++++ b/path/to/new_file.py
+@@ -0,0 +1,2 @@
++x
++y
+"""
+
+
+def build_link(path, line=None, nb_lines=None):
+    issue = Issue(path=path, level=LEVEL_WARNING, analyzer="analyzer")
+    return IssueLink(issue=issue, line=line, nb_lines=nb_lines)
+
+
+class DetectInPatchTestCase(SimpleTestCase):
+    lines = {
+        "path/to/file.cpp": [3, 4, 10, 25],
+        "path/to/new_file.py": [1, 2, 3],
+    }
+
+    def test_file_not_in_patch(self):
+        link = detect_in_patch(build_link("other.cpp", 3, 1), self.lines)
+        self.assertFalse(link.in_patch)
+
+    def test_full_file(self):
+        link = detect_in_patch(build_link("path/to/new_file.py"), self.lines)
+        self.assertTrue(link.in_patch)
+
+    def test_lines(self):
+        for line, nb_lines, in_patch in (
+            # Exact match on a modified line
+            (3, 1, True),
+            (25, 1, True),
+            # Issue range overlapping a modified line
+            (5, 6, True),
+            (20, 10, True),
+            # Issue range between or after modified lines
+            (5, 5, False),
+            (11, 14, False),
+            (26, 100, False),
+            (1, 2, False),
+            # Missing number of lines defaults to a single line
+            (4, None, True),
+            (5, None, False),
+        ):
+            with self.subTest(line=line, nb_lines=nb_lines):
+                link = detect_in_patch(
+                    build_link("path/to/file.cpp", line, nb_lines), self.lines
+                )
+                self.assertEqual(link.in_patch, in_patch)
+
+
+class LoadHgmoPatchTestCase(SimpleTestCase):
+    def test_load_parent_patch(self):
+        """
+        The patch is loaded from the parent of a try_task_config commit
+        """
+        diff = Diff(
+            mercurial_hash="deadbeef",
+            repository=Repository(url="https://hg.test/try"),
+        )
+        session = MagicMock()
+        session.get.return_value.json.return_value = {
+            "desc": "try_task_config for code-review",
+            "parents": ["coffee"],
+        }
+        session.get.return_value.text = PATCH
+
+        self.assertDictEqual(
+            load_hgmo_patch(diff, session),
+            {
+                "path/to/file.cpp": [2, 4],
+                "path/to/new_file.py": [1, 2],
+            },
+        )
+        self.assertListEqual(
+            [call.args for call in session.get.call_args_list],
+            [
+                ("https://hg.test/try/json-rev/deadbeef",),
+                ("https://hg.test/try/raw-rev/coffee",),
+            ],
+        )
+
+
+def fake_hgmo_patch(diff, session):
+    if diff.mercurial_hash == "broken":
+        raise Exception("Patch not found")
+    # Only the second line of the file is modified by all patches
+    return {"path/to/file.cpp": [2]}
+
+
+# With 2 threads, at most 4 diffs (12 links) are pending when all diffs are queued,
+# so a single batch is saved while processing and the remaining links at the end
+@patch(
+    "code_review_backend.issues.management.commands.load_in_patch.UPDATE_BATCH_SIZE",
+    15,
+)
+@patch(
+    "code_review_backend.issues.management.commands.load_in_patch.load_hgmo_patch",
+    side_effect=fake_hgmo_patch,
+)
+class LoadInPatchCommandTestCase(TestCase):
+    def setUp(self):
+        repo = Repository.objects.create(slug="myrepo", url="https://hg.test/myrepo")
+        revision = repo.head_revisions.create(
+            provider="phabricator",
+            provider_id=1,
+            title="Revision",
+            base_repository=repo,
+        )
+
+        # Create diffs with an issue on each of the 3 first lines of the file
+        for i in range(10):
+            diff = revision.diffs.create(
+                provider_id=f"PHID-DIFF-{i}",
+                review_task_id=f"task-{i}",
+                mercurial_hash="broken" if i == 3 else f"hash-{i}",
+                repository=repo,
+            )
+            for line in range(1, 4):
+                issue = Issue.objects.create(
+                    path="path/to/file.cpp",
+                    level=LEVEL_WARNING,
+                    analyzer="analyzer",
+                    hash=f"issue-{i}-{line}",
+                )
+                IssueLink.objects.create(
+                    issue=issue, revision=revision, diff=diff, line=line, nb_lines=1
+                )
+
+    def test_command(self, mock_load):
+        """
+        Check all the issue links are saved by batches, except the ones of failed diffs
+        """
+        with patch(
+            "code_review_backend.issues.management.commands.load_in_patch.save_issue_links",
+            wraps=save_issue_links,
+        ) as mock_save:
+            call_command("load_in_patch", nb_threads=2)
+
+        # Links are saved by a full batch, then by the last partial batch
+        batches = [len(call.args[0]) for call in mock_save.call_args_list]
+        self.assertEqual(len(batches), 2)
+        self.assertGreaterEqual(batches[0], 15)
+        self.assertEqual(sum(batches), 27)
+
+        self.assertListEqual(
+            list(
+                IssueLink.objects.filter(diff__mercurial_hash="broken")
+                .order_by("line")
+                .values_list("line", "in_patch")
+            ),
+            [(1, None), (2, None), (3, None)],
+        )
+
+        links = IssueLink.objects.exclude(diff__mercurial_hash="broken")
+        self.assertEqual(links.count(), 27)
+        self.assertFalse(links.filter(in_patch__isnull=True).exists())
+        self.assertListEqual(
+            list(links.filter(in_patch=True).values_list("line", flat=True)), [2] * 9
+        )
+
+    def test_command_all_diffs(self, mock_load):
+        """
+        Check each diff with unprocessed links is loaded once, as only a few
+        diffs are queued at a time and the last ones are processed at the end
+        """
+        # Links of the first diff are already processed
+        IssueLink.objects.filter(diff__provider_id="PHID-DIFF-0").update(in_patch=False)
+
+        call_command("load_in_patch", nb_threads=1)
+
+        self.assertListEqual(
+            sorted(call.args[0].provider_id for call in mock_load.call_args_list),
+            [f"PHID-DIFF-{i}" for i in range(1, 10)],
+        )
+        self.assertEqual(
+            IssueLink.objects.filter(in_patch__isnull=True).count(),
+            # Only the links of the failed diff are left
+            3,
+        )
@@ -3,11 +3,13 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import unittest
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from code_review_backend.issues.api import RevisionViewSet
 from code_review_backend.issues.models import (
     Diff,
     Issue,
@@ -99,6 +101,29 @@ class CreationAPITestCase(APITestCase):
         self.assertDictEqual(response.json(), expected_response)
         self.assertEqual(Revision.objects.count(), 1)
 
+    def test_create_revision_concurrent(self):
+        """
+        Check the existing revision is returned when it is created concurrently
+        """
+        data = {
+            "provider": "phabricator",
+            "provider_id": 456,
+            "title": "Bug XXX - Yet Another bug",
+            "bugzilla_id": 78901,
+            "base_repository": "http://repo.test/myrepo",
+            "head_repository": "http://repo.test/try",
+        }
+        self.client.force_authenticate(user=self.user)
+        with patch.object(
+            RevisionViewSet,
+            "get_existing_revision",
+            side_effect=[None, self.revision],
+        ):
+            response = self.client.post("/v1/revision/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["id"], self.revision.id)
+        self.assertEqual(Revision.objects.count(), 1)
+
     def test_create_revision_wrong_new_repo(self):
         self.revision.delete()
         data = {
@@ -56,7 +56,9 @@ class DiffAPITestCase(APITestCase):
         """
         Check we can list all diffs with their revision
         """
-        response = self.client.get("/v1/diff/")
+        # One query to count the diffs, one to retrieve the page with related objects
+        with self.assertNumQueries(2):
+            response = self.client.get("/v1/diff/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertDictEqual(
             response.json(),
@@ -168,7 +170,8 @@ class DiffAPITestCase(APITestCase):
         """
 
         # Exact repo
-        response = self.client.get("/v1/diff/?repository=myrepo")
+        with self.assertNumQueries(3):
+            response = self.client.get("/v1/diff/?repository=myrepo")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["count"], 3)
         self.assertEqual(
@@ -177,7 +180,8 @@ class DiffAPITestCase(APITestCase):
         )
 
         # Missing repo
-        response = self.client.get("/v1/diff/?repository=missing")
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/diff/?repository=missing")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["count"], 0)
 
@@ -194,6 +198,19 @@ class DiffAPITestCase(APITestCase):
             [d["provider_id"] for d in response.json()["results"]], ["PHID-DIFF-2"]
         )
 
+        # Numeric identifiers are matched exactly
+        response = self.client.get("/v1/diff/?search=1000")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 0)
+
+        # In diff id or revision provider id
+        response = self.client.get("/v1/diff/?search=2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [d["provider_id"] for d in response.json()["results"]],
+            ["PHID-DIFF-2"],
+        )
+
         # In title
         response = self.client.get("/v1/diff/?search=revision 1")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
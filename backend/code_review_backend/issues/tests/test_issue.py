@@ -103,6 +103,25 @@ class IssueTestCase(TestCase):
             },
         )
 
+    def test_list_repository_issues_wrong_changeset(self):
+        """
+        Invalid parameters are reported without looking for the revision of the date
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("repository-issues", kwargs={"repo_slug": "repo_slug"})
+                + "?date=2000-01-01&revision_changeset=whatisthat"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(),
+            {
+                "revision_changeset": [
+                    "invalid revision_changeset - should be the mercurial hash on the head repository"
+                ],
+            },
+        )
+
     def test_list_repository_issues(self):
         with self.assertNumQueries(4):
             response = self.client.get(
@@ -126,7 +145,7 @@ class IssueTestCase(TestCase):
         """
         Primarily filter issues depending on an existing revision
         """
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(5):
             response = self.client.get(
                 reverse("repository-issues", kwargs={"repo_slug": "repo_slug"})
                 + "?date=1999-01-01&revision_changeset="
@@ -142,11 +161,31 @@ class IssueTestCase(TestCase):
             ],
         )
 
+    def test_list_repository_issues_revision_filter_with_date(self):
+        """
+        Issues matching the revision are preferred to the ones of the revision found by date
+        """
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                reverse("repository-issues", kwargs={"repo_slug": "repo_slug"})
+                + "?date=2010-01-01&revision_changeset="
+                + "2" * 40
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(
+            data["results"],
+            [
+                {"id": str(self.warn_issue.id), "hash": "issue_warn"},
+            ],
+        )
+
     def test_list_repository_issues_date_fallback(self):
         """
         Fall back to the date when no issue match the given revision
         """
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(5):
             response = self.client.get(
                 reverse("repository-issues", kwargs={"repo_slug": "repo_slug"})
                 + "?date=2000-01-02&revision_changeset="
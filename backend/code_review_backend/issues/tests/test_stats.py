@@ -5,13 +5,24 @@
 import hashlib
 import random
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from code_review_backend.issues.models import Issue, IssueLink, Repository
+from code_review_backend.issues.models import (
+    LEVEL_ERROR,
+    Issue,
+    IssueLink,
+    Repository,
+    Revision,
+)
 
 
 class StatsAPITestCase(APITestCase):
@@ -94,6 +105,12 @@ class StatsAPITestCase(APITestCase):
 
         settings.PHABRICATOR_HOST = "http://anotherphab.test/api123/?custom"
 
+        # Aggregate the statistics of the new issues
+        call_command("refresh_check_stats")
+
+        # Do not reuse data cached by other tests
+        cache.clear()
+
     def test_stats(self):
         """
         Check stats generation from the list of random issues
@@ -221,9 +238,11 @@ class StatsAPITestCase(APITestCase):
         """
         Check API endpoint to list issues in a check
         """
-        response = self.client.get(
-            "/v1/check/myrepo-try/analyzer-X/check-1/?publishable=all"
-        )
+        # Repository lookup, count, issues page and their diffs
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                "/v1/check/myrepo-try/analyzer-X/check-1/?publishable=all"
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         data = response.json()
         self.assertEqual(data["count"], 34)
@@ -262,3 +281,181 @@ class StatsAPITestCase(APITestCase):
             return True
 
         self.assertTrue(all(map(check_issue, data["results"])))
+
+        # Unknown repository
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/v1/check/missing/analyzer-X/check-1/?publishable=all"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 0)
+
+    def get_new_check_stats(self, since=None):
+        """Helper to list the statistics of the check used by new issues"""
+        cache.clear()
+        url = "/v1/check/stats/"
+        if since is not None:
+            url += f"?since={since}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            stat
+            for stat in response.json()["results"]
+            if stat["analyzer"] == "analyzer-new"
+        ]
+
+    def test_stats_issue_found_on_multiple_days(self):
+        """
+        Check an issue found on revisions created on different days is counted once,
+        on the last day it has been found
+        """
+        old_revision = self.repo_try.head_revisions.create(
+            provider="phabricator",
+            provider_id=11,
+            title="Revision B",
+            base_repository=self.repo,
+        )
+        Revision.objects.filter(id=old_revision.id).update(
+            created=timezone.now() - timedelta(days=20)
+        )
+        issue = Issue.objects.create(
+            path="path/to/file",
+            level=LEVEL_ERROR,
+            analyzer="analyzer-new",
+            analyzer_check="check-new",
+            hash=uuid.uuid4().hex,
+        )
+        IssueLink.objects.create(issue=issue, revision=old_revision)
+        IssueLink.objects.create(
+            issue=issue, revision=Revision.objects.get(provider_id=10)
+        )
+        call_command("refresh_check_stats")
+
+        today = timezone.now().date()
+        expected = [
+            {
+                "analyzer": "analyzer-new",
+                "check": "check-new",
+                # Both links are publishable as the issue is an error
+                "publishable": 2,
+                "repository": "myrepo-try",
+                "total": 1,
+            }
+        ]
+        for since in (None, today - timedelta(days=30), today):
+            with self.subTest(since=since):
+                self.assertEqual(self.get_new_check_stats(since), expected)
+
+        # The issue has not been found after its last revision
+        self.assertEqual(self.get_new_check_stats(today + timedelta(days=1)), [])
+
+    def test_stats_refresh(self):
+        """
+        Check new issues are only listed in the statistics once they are refreshed
+        """
+        issue = Issue.objects.create(
+            path="path/to/file",
+            level="warning",
+            analyzer="analyzer-new",
+            analyzer_check="check-new",
+            hash=uuid.uuid4().hex,
+        )
+        IssueLink.objects.create(
+            issue=issue, revision=Revision.objects.get(provider_id=10), in_patch=True
+        )
+
+        # Other backends than PostgreSQL use a plain view that is always up to date
+        if connection.vendor == "postgresql":
+            self.assertEqual(self.get_new_check_stats(), [])
+
+        call_command("refresh_check_stats")
+        self.assertEqual(
+            self.get_new_check_stats(),
+            [
+                {
+                    "analyzer": "analyzer-new",
+                    "check": "check-new",
+                    "publishable": 1,
+                    "repository": "myrepo-try",
+                    "total": 1,
+                }
+            ],
+        )
+
+    def test_stats_pages_cache(self):
+        """
+        Check the statistics are cached once for all the pages
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/check/stats/?limit=10")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.json()
+        self.assertEqual(first_page["count"], 15)
+        self.assertEqual(len(first_page["results"]), 10)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/v1/check/stats/?limit=10&offset=10")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        second_page = response.json()
+        self.assertEqual(second_page["count"], 15)
+        self.assertEqual(len(second_page["results"]), 5)
+        self.assertIsNone(second_page["next"])
+
+        # Both pages are parts of the complete list
+        with self.assertNumQueries(0):
+            response = self.client.get("/v1/check/stats/")
+        self.assertListEqual(
+            first_page["results"] + second_page["results"],
+            response.json()["results"],
+        )
+
+    def test_history_cache(self):
+        """
+        Check the history is cached until an issue is updated
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/check/history/?analyzer=analyzer-X")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(point["total"] for point in response.json()), 171)
+
+        # Cached for the same parameters
+        with self.assertNumQueries(0):
+            response = self.client.get("/v1/check/history/?analyzer=analyzer-X")
+        self.assertEqual(sum(point["total"] for point in response.json()), 171)
+
+        # Updating an issue invalidates the cache
+        issue = Issue.objects.filter(analyzer="analyzer-X").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            issue.analyzer = "analyzer-Y"
+            issue.save()
+        with self.assertNumQueries(1):
+            response = self.client.get("/v1/check/history/?analyzer=analyzer-X")
+        self.assertEqual(sum(point["total"] for point in response.json()), 170)
+
+    def test_history_repository(self):
+        """
+        Check the history only counts once the issues found in a repository
+        """
+        # Reference all the issues of a diff on another diff of the same revision
+        revision = Revision.objects.get(provider_id=10)
+        diff = revision.diffs.create(
+            id=11,
+            provider_id="PHID-DIFF-11",
+            review_task_id="task-10",
+            mercurial_hash=hashlib.sha1(b"hg 10").hexdigest(),
+            repository=self.repo_try,
+        )
+        IssueLink.objects.bulk_create(
+            [
+                IssueLink(issue_id=link.issue_id, revision=revision, diff=diff)
+                for link in IssueLink.objects.filter(diff_id=1)
+            ]
+        )
+        for repository in ("myrepo", "myrepo-try"):
+            response = self.client.get(f"/v1/check/history/?repository={repository}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(sum(point["total"] for point in response.json()), 500)
+
+        response = self.client.get("/v1/check/history/?repository=missing")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
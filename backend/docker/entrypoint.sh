@@ -10,4 +10,14 @@ python /src/backend/docker/wait_for_db.py
 # Run the migrations
 ./manage.py migrate --noinput
 
+# Create the table storing cached data, when using the database cache backend
+./manage.py createcachetable
+
+# Refresh the checks statistics periodically in the background (every 30 minutes by default)
+# A failed refresh is retried on the next run, without stopping the web server
+while true; do
+  ./manage.py refresh_check_stats || echo "Failed to refresh checks statistics"
+  sleep "${CHECK_STATS_REFRESH_INTERVAL:-1800}"
+done &
+
 gunicorn code_review_backend.app.wsgi